@@ -181,3 +181,12 @@ TASKS = {
         },
     },
 }
+
+# Task Result Retention (days per status; omit or `None` to retain indefinitely)
+TASKS_CLOUD_RESULT_RETENTION = {
+    "SUCCESSFUL": 7,
+    "FAILED": 30,
+}
+
+# Task Group Retention (days since last update; `None` to retain indefinitely)
+TASKS_CLOUD_GROUP_RETENTION = 30
@@ -1,16 +1,45 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from json import dumps
 from traceback import format_exc
 
 import boto3
 from botocore.exceptions import ClientError as BotoClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
+from botocore.exceptions import HTTPClientError as BotoHTTPClientError
 from django.core.exceptions import ImproperlyConfigured
 from django.tasks import Task, TaskResult, TaskResultStatus
 from django.tasks.backends.base import BaseTaskBackend
 from django.tasks.base import TaskError
 
+from django_tasks_cloud.base.ratelimit import RateLimiter, RateLimitExceeded
+from django_tasks_cloud.base.routing import DestinationRouter
+from django_tasks_cloud.base.stats import QueueStats, QueueStatsMixin
 
-class AWSBaseBackend(BaseTaskBackend):
+_SQS_STATS_ATTRIBUTES = [
+    "ApproximateNumberOfMessages",
+    "ApproximateNumberOfMessagesNotVisible",
+    "ApproximateNumberOfMessagesDelayed",
+]
+
+
+def _get_sqs_queue_stats(
+    sqs_client, alias: str, queue_name: str, queue_url: str
+) -> QueueStats:
+    # SQS exposes no age of the oldest message here (only as a CloudWatch metric)
+    attrs = sqs_client.get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=_SQS_STATS_ATTRIBUTES
+    )["Attributes"]
+
+    return QueueStats(
+        alias,
+        queue_name,
+        depth=int(attrs["ApproximateNumberOfMessages"]),
+        in_flight=int(attrs["ApproximateNumberOfMessagesNotVisible"]),
+        scheduled=int(attrs["ApproximateNumberOfMessagesDelayed"]),
+    )
+
+
+class AWSBaseBackend(QueueStatsMixin, BaseTaskBackend):
     supports_get_result = True
 
     def __init__(self, alias, params):
@@ -19,6 +48,13 @@ class AWSBaseBackend(BaseTaskBackend):
         if not self.region_name:
             raise ImproperlyConfigured("Unset: AWS_REGION")
 
+        # Throttling is retried by botocore itself, and surfaces as a generic
+        # `ClientError` once retries are exhausted
+        self.router = DestinationRouter.from_backend(
+            self, unhealthy_on=(BotoConnectionError, BotoHTTPClientError)
+        )
+        self.rate_limiter = RateLimiter.from_backend(self)
+
     def _publish_message(self, task: Task, payload: dict) -> str:
         raise NotImplementedError
 
@@ -51,7 +87,7 @@ class AWSBaseBackend(BaseTaskBackend):
             object.__setattr__(task_result, "id", message_id)
             object.__setattr__(task_result, "enqueued_at", datetime.now(timezone.utc))
 
-        except BotoClientError as exc:
+        except (BotoClientError, RateLimitExceeded) as exc:
             task_error = TaskError(
                 exception_class_path=f"{exc.__class__.__module__}.{exc.__class__.__qualname__}",
                 traceback=format_exc(),
@@ -63,6 +99,8 @@ class AWSBaseBackend(BaseTaskBackend):
 
 
 class SQSBackend(AWSBaseBackend):
+    supports_queue_stats = True
+
     def __init__(self, alias, params):
         super().__init__(alias, params)
 
@@ -81,14 +119,23 @@ class SQSBackend(AWSBaseBackend):
         return self._queue_urls[queue_name]
 
     def _publish_message(self, task: Task, payload: dict) -> str:
-        queue_name = task.queue_name or self.default_queue_name
-        queue_url = self._get_queue_url(queue_name)
-        response = self.sqs_client.send_message(
-            QueueUrl=queue_url, MessageBody=dumps(payload)
-        )
+        message_body = dumps(payload)
+        with self.router.route(
+            task.queue_name or self.default_queue_name, payload["kwargs"]
+        ) as queue_name:
+            self.rate_limiter.acquire(queue_name, len(message_body.encode()))
+            queue_url = self._get_queue_url(queue_name)
+            response = self.sqs_client.send_message(
+                QueueUrl=queue_url, MessageBody=message_body
+            )
 
         return response.get("MessageId")
 
+    def _fetch_queue_stats(self, destination: str) -> QueueStats:
+        return _get_sqs_queue_stats(
+            self.sqs_client, self.alias, destination, self._get_queue_url(destination)
+        )
+
 
 class SNSTopicBackend(AWSBaseBackend):
     def __init__(self, alias, params):
@@ -107,14 +154,21 @@ class SNSTopicBackend(AWSBaseBackend):
         self.sns_client = boto3.client("sns", region_name=self.region_name)
 
     def _publish_message(self, task: Task, payload: dict) -> str:
-        topic_arn = self.sns_arn_prefix + task.queue_name or self.default_topic
-        response = self.sns_client.publish(TopicArn=topic_arn, Message=dumps(payload))
+        message = dumps(payload)
+        with self.router.route(
+            task.queue_name or self.default_topic, payload["kwargs"]
+        ) as topic_name:
+            self.rate_limiter.acquire(topic_name, len(message.encode()))
+            response = self.sns_client.publish(
+                TopicArn=self.sns_arn_prefix + topic_name, Message=message
+            )
 
         return response.get("MessageId")
 
 
 class EventBridgeSchedulerBackend(AWSBaseBackend):
     supports_defer = True
+    supports_queue_stats = True
 
     def __init__(self, alias, params):
         super().__init__(alias, params)
@@ -129,13 +183,20 @@ class EventBridgeSchedulerBackend(AWSBaseBackend):
 
         self.sqs_client = boto3.client("sqs", region_name=self.region_name)
         self.scheduler_client = boto3.client("scheduler", region_name=self.region_name)
+        self._queue_urls = {}
         self._queue_arns = {}
 
+    def _get_queue_url(self, queue_name: str) -> str:
+        if queue_name not in self._queue_urls:
+            response = self.sqs_client.get_queue_url(QueueName=queue_name)
+            self._queue_urls[queue_name] = response["QueueUrl"]
+
+        return self._queue_urls[queue_name]
+
     def _get_queue_arn(self, queue_name):
         if queue_name not in self._queue_arns:
             try:
-                response = self.sqs_client.get_queue_url(QueueName=queue_name)
-                queue_url = response["QueueUrl"]
+                queue_url = self._get_queue_url(queue_name)
 
                 attrs = self.sqs_client.get_queue_attributes(
                     QueueUrl=queue_url, AttributeNames=["QueueArn"]
@@ -150,35 +211,46 @@ class EventBridgeSchedulerBackend(AWSBaseBackend):
         return self._queue_arns[queue_name]
 
     def _publish_message(self, task: Task, payload: dict) -> str:
-        destination_queue_name = task.queue_name or self.default_queue_name
-        queue_arn = self._get_queue_arn(destination_queue_name)
-
         if task.run_after is None:
             # WARNING
             object.__setattr__(task, "run_after", datetime.now(timezone.utc))
 
-        schedule_time = (
-            task.run_after.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")  # type: ignore
-        )
         schedule_name = (
             f"django-task-{task.name}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
         )
+        schedule_input = dumps(payload)
 
-        self.scheduler_client.create_schedule(
-            Name=schedule_name,
-            ScheduleExpression=f"at({schedule_time})",
-            ScheduleExpressionTimezone="UTC",
-            State="ENABLED",
-            ActionAfterCompletion="DELETE",
-            FlexibleTimeWindow={"Mode": "OFF"},
-            Target={
-                "Arn": queue_arn,
-                "RoleArn": self.scheduler_role_arn,
-                "Input": dumps(payload),
-            },
-        )
+        with self.router.route(
+            task.queue_name or self.default_queue_name, payload["kwargs"]
+        ) as destination_queue_name:
+            delay = self.rate_limiter.acquire(
+                destination_queue_name, len(schedule_input.encode())
+            )
+            run_after = task.run_after + timedelta(seconds=delay)  # type: ignore
+            schedule_time = (
+                run_after.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+            )
+            queue_arn = self._get_queue_arn(destination_queue_name)
+            self.scheduler_client.create_schedule(
+                Name=schedule_name,
+                ScheduleExpression=f"at({schedule_time})",
+                ScheduleExpressionTimezone="UTC",
+                State="ENABLED",
+                ActionAfterCompletion="DELETE",
+                FlexibleTimeWindow={"Mode": "OFF"},
+                Target={
+                    "Arn": queue_arn,
+                    "RoleArn": self.scheduler_role_arn,
+                    "Input": schedule_input,
+                },
+            )
         return schedule_name
 
+    def _fetch_queue_stats(self, destination: str) -> QueueStats:
+        return _get_sqs_queue_stats(
+            self.sqs_client, self.alias, destination, self._get_queue_url(destination)
+        )
+
 
 class AWSLambdaBackend(AWSBaseBackend):
     supports_get_result = False
@@ -195,12 +267,15 @@ class AWSLambdaBackend(AWSBaseBackend):
         self.lambda_client = boto3.client("lambda", region_name=self.region_name)
 
     def _publish_message(self, task: Task, payload: dict) -> str:
-        function_name = task.queue_name or self.default_function_name
-
-        response = self.lambda_client.invoke(
-            FunctionName=function_name,
-            InvocationType="Event",
-            Payload=dumps(payload),
-        )
+        invocation_payload = dumps(payload)
+        with self.router.route(
+            task.queue_name or self.default_function_name, payload["kwargs"]
+        ) as function_name:
+            self.rate_limiter.acquire(function_name, len(invocation_payload.encode()))
+            response = self.lambda_client.invoke(
+                FunctionName=function_name,
+                InvocationType="Event",
+                Payload=invocation_payload,
+            )
 
         return response.get("ResponseMetadata", {}).get("RequestId")
@@ -1 +1,34 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from django_tasks_cloud.aws.backends import EventBridgeSchedulerBackend
+
+
+class EventBridgeSchedulerQueueStatsTests(SimpleTestCase):
+    def test_queue_url_is_resolved_once(self):
+        backend = EventBridgeSchedulerBackend(
+            "eventbridge_stats",
+            {
+                "OPTIONS": {
+                    "AWS_REGION": "ap-south-1",
+                    "AWS_DEFAULT_SQS_QUEUE_NAME": "emails",
+                    "EVENTBRIDGE_SCHEDULER_ROLE_ARN": "arn:aws:iam::1:role/scheduler",
+                }
+            },
+        )
+        backend.sqs_client = mock.Mock()
+        backend.sqs_client.get_queue_url.return_value = {"QueueUrl": "https://sqs/1"}
+        backend.sqs_client.get_queue_attributes.return_value = {
+            "Attributes": {
+                "ApproximateNumberOfMessages": "3",
+                "ApproximateNumberOfMessagesNotVisible": "2",
+                "ApproximateNumberOfMessagesDelayed": "1",
+            }
+        }
+
+        for _ in range(3):
+            stats = backend._fetch_queue_stats("emails")
+
+        backend.sqs_client.get_queue_url.assert_called_once_with(QueueName="emails")
+        self.assertEqual((stats.depth, stats.in_flight, stats.scheduled), (3, 2, 1))
@@ -1,22 +1,34 @@
+from contextlib import AbstractContextManager
 from datetime import datetime, timezone
 from json import dumps
 from traceback import format_exc
 
-from azure.core.exceptions import AzureError
-from azure.identity import DefaultAzureCredential
-from azure.storage.queue import (
-    QueueClient,
-    QueueServiceClient,
+from azure.core.exceptions import (
+    AzureError,
+    ServiceRequestError,
+    ServiceResponseError,
 )
+from azure.identity import DefaultAzureCredential
+from azure.storage.queue import QueueClient, QueueServiceClient
 from django.core.exceptions import ImproperlyConfigured
 from django.tasks import Task, TaskResult, TaskResultStatus
 from django.tasks.backends.base import BaseTaskBackend
 from django.tasks.base import TaskError
 from django.utils.module_loading import import_string
 
+from django_tasks_cloud.base.pool import (
+    ConnectionPool,
+    checkout_shared,
+    close_shared_pools,
+)
+from django_tasks_cloud.base.ratelimit import RateLimiter, RateLimitExceeded
+from django_tasks_cloud.base.routing import DestinationRouter
+from django_tasks_cloud.base.stats import QueueStats, QueueStatsMixin
 
-class StorageAccountQueueBackend(BaseTaskBackend):
+
+class StorageAccountQueueBackend(QueueStatsMixin, BaseTaskBackend):
     supports_get_result = True
+    supports_queue_stats = True
 
     def __init__(self, alias, params):
         super().__init__(alias, params)
@@ -51,31 +63,53 @@ class StorageAccountQueueBackend(BaseTaskBackend):
 
             credential_loader = self.options.get("STORAGE_ACCOUNT_CREDENTIAL_LOADER")
             if not credential_loader:
-                self.queue_service_client = QueueServiceClient(
-                    self.storage_account_url, credential=DefaultAzureCredential()
-                )
+                self.credential = DefaultAzureCredential()
             else:
-                self.queue_service_client = QueueServiceClient(
-                    self.storage_account_url,
-                    credential=import_string(credential_loader)(),
-                )
+                self.credential = import_string(credential_loader)()
+            self.queue_service_client = QueueServiceClient(
+                self.storage_account_url, credential=self.credential
+            )
 
-        self._queue_clients: dict[str, QueueClient] = {}
+        self.router = DestinationRouter.from_backend(
+            self, unhealthy_on=(ServiceRequestError, ServiceResponseError)
+        )
+        self.rate_limiter = RateLimiter.from_backend(self)
+        self.client_pool_size = self.options.get(
+            "STORAGE_ACCOUNT_QUEUE_CLIENT_POOL_SIZE", 4
+        )
+        if not isinstance(self.client_pool_size, int) or self.client_pool_size < 1:
+            raise ImproperlyConfigured(
+                "Invalid: STORAGE_ACCOUNT_QUEUE_CLIENT_POOL_SIZE = "
+                f"{self.client_pool_size!r}"
+            )
 
-    def _get_queue_client(self, queue_name: str) -> QueueClient:
-        if queue_name not in self._queue_clients:
-            self._queue_clients[queue_name] = (
-                self.queue_service_client.get_queue_client(queue=queue_name)
+    def _build_queue_client(self, queue_name: str) -> QueueClient:
+        # Not `queue_service_client.get_queue_client`, whose clients all share
+        # the transport (and its connection pool) of the service client
+        if self.use_connection_string:
+            return QueueClient.from_connection_string(
+                self.connection_string, queue_name
             )
+        return QueueClient(
+            self.storage_account_url, queue_name, credential=self.credential
+        )
 
-        return self._queue_clients[queue_name]
+    def _checkout_queue_client(
+        self, queue_name: str
+    ) -> AbstractContextManager[QueueClient]:
+        return checkout_shared(
+            self.alias,
+            queue_name,
+            lambda: ConnectionPool(
+                lambda: self._build_queue_client(queue_name),
+                self.client_pool_size,
+                discard_on=(ServiceRequestError,),
+            ),
+        )
 
     def enqueue(self, task: Task, args, kwargs) -> TaskResult:
         self.validate_task(task)
 
-        destination_name = task.queue_name or self.default_destination_name
-        queue_client = self._get_queue_client(destination_name)
-
         payload = {
             "task": task.name,
             "args": args,
@@ -98,10 +132,17 @@ class StorageAccountQueueBackend(BaseTaskBackend):
         )
 
         try:
-            result = queue_client.send_message(message_content, timeout=5)
+            with self.router.route(
+                task.queue_name or self.default_destination_name, kwargs
+            ) as destination_name:
+                self.rate_limiter.acquire(
+                    destination_name, len(message_content.encode())
+                )
+                with self._checkout_queue_client(destination_name) as queue_client:
+                    result = queue_client.send_message(message_content, timeout=5)
             object.__setattr__(task_result, "enqueued_at", datetime.now(timezone.utc))
             object.__setattr__(task_result, "id", result.id)
-        except AzureError as exc:
+        except (AzureError, RateLimitExceeded) as exc:
             task_error = TaskError(
                 exception_class_path=f"{exc.__class__.__module__}.{exc.__class__.__qualname__}",
                 traceback=format_exc(),
@@ -111,5 +152,28 @@ class StorageAccountQueueBackend(BaseTaskBackend):
 
         return task_result
 
+    def _fetch_queue_stats(self, destination: str) -> QueueStats:
+        # Storage Queues count invisible (in-flight) messages as available
+        with self._checkout_queue_client(destination) as queue_client:
+            properties = queue_client.get_queue_properties(timeout=5)
+            messages = queue_client.peek_messages(max_messages=1, timeout=5)
+
+        oldest_age = None
+        if messages and messages[0].inserted_on:
+            oldest_age = (
+                datetime.now(timezone.utc) - messages[0].inserted_on
+            ).total_seconds()
+
+        return QueueStats(
+            self.alias,
+            destination,
+            depth=properties.approximate_message_count,
+            oldest_age=oldest_age,
+        )
+
     def get_result(self, result_id):
         return super().get_result(result_id)
+
+    def close(self):
+        close_shared_pools(self.alias)
+        self.queue_service_client.close()
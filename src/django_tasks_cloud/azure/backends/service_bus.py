@@ -1,21 +1,40 @@
-from datetime import datetime, timezone
+from contextlib import AbstractContextManager
+from datetime import datetime, timedelta, timezone
 from json import dumps
 from traceback import format_exc
 from typing import Any, Callable
 
 from azure.identity import DefaultAzureCredential
 from azure.servicebus import ServiceBusClient, ServiceBusMessage, ServiceBusSender
-from azure.servicebus.exceptions import ServiceBusError
+from azure.servicebus.exceptions import (
+    OperationTimeoutError,
+    ServiceBusCommunicationError,
+    ServiceBusConnectionError,
+    ServiceBusError,
+    ServiceBusQuotaExceededError,
+    ServiceBusServerBusyError,
+)
+from azure.servicebus.management import ServiceBusAdministrationClient
 from django.core.exceptions import ImproperlyConfigured
 from django.tasks import Task, TaskResult, TaskResultStatus
 from django.tasks.backends.base import BaseTaskBackend
 from django.tasks.base import TaskError
 from django.utils.module_loading import import_string
 
+from django_tasks_cloud.base.pool import (
+    ConnectionPool,
+    checkout_shared,
+    close_shared_pools,
+)
+from django_tasks_cloud.base.ratelimit import RateLimiter, RateLimitExceeded
+from django_tasks_cloud.base.routing import DestinationRouter
+from django_tasks_cloud.base.stats import QueueStats, QueueStatsMixin
 
-class _ServiceBusBaseBackend(BaseTaskBackend):
+
+class _ServiceBusBaseBackend(QueueStatsMixin, BaseTaskBackend):
     supports_defer = True
     supports_get_result = True
+    supports_queue_stats = True
 
     _default_destination_config_key: str
 
@@ -41,6 +60,11 @@ class _ServiceBusBaseBackend(BaseTaskBackend):
             self.servicebus_client = ServiceBusClient.from_connection_string(
                 self.connection_string
             )
+            self.administration_client = (
+                ServiceBusAdministrationClient.from_connection_string(
+                    self.connection_string
+                )
+            )
         else:
             self.servicebus_namespace = self.options.get("SERVICEBUS_NAMESPACE_FQDN")
             if not self.servicebus_namespace:
@@ -48,37 +72,60 @@ class _ServiceBusBaseBackend(BaseTaskBackend):
 
             credential_loader = self.options.get("SERVICEBUS_CREDENTIAL_LOADER")
             if not credential_loader:
-                self.servicebus_client = ServiceBusClient(
-                    self.servicebus_namespace, credential=DefaultAzureCredential()
-                )
+                credential = DefaultAzureCredential()
             else:
-                self.servicebus_client = ServiceBusClient(
-                    self.servicebus_namespace,
-                    credential=import_string(credential_loader)(),
-                )
+                credential = import_string(credential_loader)()
+
+            self.servicebus_client = ServiceBusClient(
+                self.servicebus_namespace, credential=credential
+            )
+            self.administration_client = ServiceBusAdministrationClient(
+                self.servicebus_namespace, credential=credential
+            )
 
-        self._senders = {}
+        self.router = DestinationRouter.from_backend(
+            self,
+            unhealthy_on=(
+                ServiceBusConnectionError,
+                ServiceBusCommunicationError,
+                ServiceBusServerBusyError,
+                ServiceBusQuotaExceededError,
+                OperationTimeoutError,
+            ),
+        )
+        self.rate_limiter = RateLimiter.from_backend(self)
+        self.sender_pool_size = self.options.get("SERVICEBUS_SENDER_POOL_SIZE", 4)
+        if not isinstance(self.sender_pool_size, int) or self.sender_pool_size < 1:
+            raise ImproperlyConfigured(
+                f"Invalid: SERVICEBUS_SENDER_POOL_SIZE = {self.sender_pool_size!r}"
+            )
 
-    def _get_sender(
+    def _checkout_sender(
         self, destination_name: str, getter_method: Callable[[Any], ServiceBusSender]
-    ):
-        if destination_name not in self._senders:
-            self._senders[destination_name] = getter_method(destination_name)
-        return self._senders[destination_name]
+    ) -> AbstractContextManager[ServiceBusSender]:
+        # An AMQP sender link must not be shared between threads. The SDK
+        # reattaches a detached link on the next send; senders whose connection
+        # failed are replaced.
+        return checkout_shared(
+            self.alias,
+            destination_name,
+            lambda: ConnectionPool(
+                lambda: getter_method(destination_name),
+                self.sender_pool_size,
+                discard_on=(ServiceBusConnectionError, ServiceBusCommunicationError),
+            ),
+        )
 
     def enqueue(self, task: Task, args, kwargs) -> TaskResult:
         self.validate_task(task)
 
-        destination_name = task.queue_name or self.default_destination_name
-        sender = self._get_destination_sender(  # type: ignore[reportAttributeAccessIssue]
-            destination_name
-        )  # Implemented in: Subclasses
         payload = {
             "task": task.name,
             "args": args,
             "kwargs": kwargs,
         }
-        message = ServiceBusMessage(dumps(payload))
+        message_body = dumps(payload)
+        message = ServiceBusMessage(message_body)
         task_result = TaskResult(
             task=task,
             id=message.message_id,  # type: ignore[reportArgumentType]
@@ -95,18 +142,32 @@ class _ServiceBusBaseBackend(BaseTaskBackend):
         )
 
         try:
-            if task.run_after:
-                sender.schedule_messages(
-                    message,
-                    schedule_time_utc=task.run_after
-                    if task.run_after.tzname() == "UTC"
-                    else task.run_after.astimezone(timezone.utc),
-                    timeout=5,
+            with self.router.route(
+                task.queue_name or self.default_destination_name, kwargs
+            ) as destination_name:
+                run_after = task.run_after
+                delay = self.rate_limiter.acquire(
+                    destination_name, len(message_body.encode())
                 )
-            else:
-                sender.send_messages(message, timeout=5)
+                if delay:
+                    run_after = (run_after or datetime.now(timezone.utc)) + timedelta(
+                        seconds=delay
+                    )
+                with self._checkout_destination_sender(  # type: ignore[reportAttributeAccessIssue]
+                    destination_name
+                ) as sender:  # Implemented in: Subclasses
+                    if run_after:
+                        sender.schedule_messages(
+                            message,
+                            schedule_time_utc=run_after
+                            if run_after.tzname() == "UTC"
+                            else run_after.astimezone(timezone.utc),
+                            timeout=5,
+                        )
+                    else:
+                        sender.send_messages(message, timeout=5)
             object.__setattr__(task_result, "enqueued_at", datetime.now(timezone.utc))
-        except ServiceBusError as exc:
+        except (ServiceBusError, RateLimitExceeded) as exc:
             task_error = TaskError(
                 exception_class_path=f"{exc.__class__.__module__}.{exc.__class__.__qualname__}",
                 traceback=format_exc(),
@@ -121,21 +182,67 @@ class _ServiceBusBaseBackend(BaseTaskBackend):
         return super().get_result(result_id)
 
     def close(self):
-        for sender in self._senders.values():
-            sender.close()
-        self._senders.clear()
+        close_shared_pools(self.alias)
         self.servicebus_client.close()
+        self.administration_client.close()
 
 
 class ServiceBusQueueBackend(_ServiceBusBaseBackend):
     _default_destination_config_key: str = "SERVICEBUS_DEFAULT_QUEUE_NAME"
 
-    def _get_destination_sender(self, queue_name):
-        return self._get_sender(queue_name, self.servicebus_client.get_queue_sender)
+    def _checkout_destination_sender(self, queue_name):
+        return self._checkout_sender(
+            queue_name, self.servicebus_client.get_queue_sender
+        )
+
+    def _fetch_queue_stats(self, destination: str) -> QueueStats:
+        # Locked (in-flight) messages are counted as active, not separately
+        properties = self.administration_client.get_queue_runtime_properties(
+            destination
+        )
+
+        oldest_age = None
+        if properties.active_message_count:
+            with self.servicebus_client.get_queue_receiver(destination) as receiver:
+                messages = receiver.peek_messages(max_message_count=1, timeout=5)
+            if messages and messages[0].enqueued_time_utc:
+                oldest_age = (
+                    datetime.now(timezone.utc) - messages[0].enqueued_time_utc
+                ).total_seconds()
+
+        return QueueStats(
+            self.alias,
+            destination,
+            depth=properties.active_message_count,
+            scheduled=properties.scheduled_message_count,
+            oldest_age=oldest_age,
+        )
 
 
 class ServiceBusTopicBackend(_ServiceBusBaseBackend):
     _default_destination_config_key: str = "SERVICEBUS_DEFAULT_TOPIC_NAME"
 
-    def _get_destination_sender(self, topic_name):
-        return self._get_sender(topic_name, self.servicebus_client.get_topic_sender)
+    def _checkout_destination_sender(self, topic_name):
+        return self._checkout_sender(
+            topic_name, self.servicebus_client.get_topic_sender
+        )
+
+    def _fetch_queue_stats(self, destination: str) -> QueueStats:
+        # Messages are counted once per subscription they are pending in
+        properties = self.administration_client.get_topic_runtime_properties(
+            destination
+        )
+        subscriptions = (
+            self.administration_client.list_subscriptions_runtime_properties(
+                destination
+            )
+        )
+
+        return QueueStats(
+            self.alias,
+            destination,
+            depth=sum(
+                subscription.active_message_count for subscription in subscriptions
+            ),
+            scheduled=properties.scheduled_message_count,
+        )
@@ -1 +1,134 @@
-from django.test import TestCase
+from threading import Barrier, Thread
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from django_tasks_cloud.azure.backends.sa_queue import StorageAccountQueueBackend
+from django_tasks_cloud.azure.backends.service_bus import ServiceBusQueueBackend
+
+SERVICEBUS_CONNECTION_STRING = (
+    "Endpoint=sb://example.servicebus.windows.net/;"
+    "SharedAccessKeyName=RootManageSharedAccessKey;SharedAccessKey=a2V5"
+)
+STORAGE_ACCOUNT_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=https;AccountName=example;AccountKey=a2V5;"
+    "EndpointSuffix=core.windows.net"
+)
+
+
+class ServiceBusSenderPoolTests(SimpleTestCase):
+    def make_backend(self, **options):
+        return ServiceBusQueueBackend(
+            "servicebus_pool",
+            {
+                "OPTIONS": {
+                    "SERVICEBUS_DEFAULT_QUEUE_NAME": "emails",
+                    "SERVICEBUS_CONNECTION_STRING": SERVICEBUS_CONNECTION_STRING,
+                    **options,
+                }
+            },
+        )
+
+    def tearDown(self):
+        self.make_backend().close()
+
+    def test_instances_share_their_senders(self):
+        first, second = self.make_backend(), self.make_backend()
+
+        with mock.patch.object(
+            first.servicebus_client, "get_queue_sender"
+        ) as get_queue_sender:
+            with first._checkout_destination_sender("emails"):
+                pass
+            with second._checkout_destination_sender("emails"):
+                pass
+
+        get_queue_sender.assert_called_once_with("emails")
+
+    def test_concurrent_checkouts_get_distinct_senders(self):
+        backends = [self.make_backend() for _ in range(3)]
+        barrier = Barrier(len(backends))
+        senders = []
+
+        def send(backend):
+            with backend._checkout_destination_sender("emails") as sender:
+                senders.append(sender)
+                barrier.wait(timeout=5)
+
+        with mock.patch.object(
+            backends[0].servicebus_client,
+            "get_queue_sender",
+            side_effect=lambda name: mock.Mock(),
+        ):
+            threads = [Thread(target=send, args=(b,)) for b in backends]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(set(map(id, senders))), 3)
+
+    def test_pools_closed_by_another_instance_are_replaced(self):
+        first, second = self.make_backend(), self.make_backend()
+
+        with mock.patch.object(
+            first.servicebus_client,
+            "get_queue_sender",
+            side_effect=lambda name: mock.Mock(),
+        ):
+            with first._checkout_destination_sender("emails") as sender:
+                second.close()
+            with first._checkout_destination_sender("emails") as replacement:
+                pass
+
+        sender.close.assert_called_once()
+        self.assertIsNot(replacement, sender)
+
+    def test_rejects_invalid_pool_size(self):
+        for size in (0, "4"):
+            with self.subTest(size=size):
+                with self.assertRaises(ImproperlyConfigured):
+                    self.make_backend(SERVICEBUS_SENDER_POOL_SIZE=size)
+
+
+class StorageAccountQueueClientPoolTests(SimpleTestCase):
+    def make_backend(self, **options):
+        return StorageAccountQueueBackend(
+            "sa_queue_pool",
+            {
+                "OPTIONS": {
+                    "STORAGE_ACCOUNT_QUEUE_DEFAULT_QUEUE_NAME": "emails",
+                    "STORAGE_ACCOUNT_CONNECTION_STRING": (
+                        STORAGE_ACCOUNT_CONNECTION_STRING
+                    ),
+                    **options,
+                }
+            },
+        )
+
+    def tearDown(self):
+        self.make_backend().close()
+
+    def test_pooled_clients_have_their_own_transport(self):
+        backend = self.make_backend()
+
+        with (
+            backend._checkout_queue_client("emails") as first,
+            self.make_backend()._checkout_queue_client("emails") as second,
+        ):
+            self.assertEqual(first.queue_name, "emails")
+            self.assertIsNot(first._client._client, second._client._client)
+            self.assertIsNot(
+                first._client._client,
+                backend.queue_service_client._client._client,
+            )
+
+        with backend._checkout_queue_client("emails") as reused:
+            self.assertIn(reused, (first, second))
+
+    def test_rejects_invalid_pool_size(self):
+        for size in (-1, "4"):
+            with self.subTest(size=size):
+                with self.assertRaises(ImproperlyConfigured):
+                    self.make_backend(STORAGE_ACCOUNT_QUEUE_CLIENT_POOL_SIZE=size)
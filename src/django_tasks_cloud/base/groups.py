@@ -0,0 +1,169 @@
+from collections.abc import Iterable
+from typing import Any
+
+from django.db.models import F
+from django.tasks import Task, TaskResultStatus
+from django.tasks import TaskResult as EnqueuedTaskResult
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from django_tasks_cloud.base.models import TaskGroup, TaskResult
+
+FINISHED_STATUSES = (TaskResultStatus.SUCCESSFUL, TaskResultStatus.FAILED)
+
+
+def _count_finished(group_id, finished: int, failed: int):
+    TaskGroup.objects.filter(pk=group_id).update(
+        finished=F("finished") + finished,
+        failed=F("failed") + failed,
+        updated_at=timezone.now(),
+    )
+    enqueue_group_callback(group_id)
+
+
+def enqueue_group(
+    members: Iterable[tuple[Task, Iterable[Any], dict[str, Any]]],
+    callback: Task | None = None,
+    callback_args: Iterable[Any] = (),
+    callback_kwargs: dict[str, Any] | None = None,
+) -> TaskGroup:
+    """
+    Enqueue every `(task, args, kwargs)` in `members` as one group. Once all of
+    them have finished, `callback` is enqueued (once) with `callback_args` and
+    `callback_kwargs`, plus the `group_id` keyword argument. The back-end,
+    queue, priority and `run_after` of `callback` are kept.
+
+    Members that fail to enqueue (with a FAILED result, or by raising) count as
+    finished and failed right away.
+    """
+    members = list(members)
+    group = TaskGroup.objects.create(
+        size=len(members),
+        callback=callback.module_path if callback else None,
+        callback_backend=callback.backend if callback else None,
+        callback_queue_name=callback.queue_name if callback else None,
+        callback_priority=callback.priority if callback else None,
+        callback_run_after=callback.run_after if callback else None,
+        callback_args=list(callback_args),
+        callback_kwargs=callback_kwargs or {},
+    )
+
+    rows = []
+    finished = failed = 0
+    for task, args, kwargs in members:
+        try:
+            result = task.enqueue(*args, **kwargs)
+        except Exception:
+            # Back-ends report most failures as a FAILED result, but not all
+            result = None
+
+        if result is None or result.status == TaskResultStatus.FAILED or not result.id:
+            finished += 1
+            failed += 1
+            continue
+
+        rows.append(
+            TaskResult(
+                id=result.id,
+                task=task.module_path,
+                status=result.status,
+                enqueued_at=result.enqueued_at,
+                backend=result.backend,
+                args=result.args,
+                kwargs=result.kwargs,
+                group=group,
+            )
+        )
+
+    # Members that finished, and were recorded, before they could be inserted
+    # already have a row (without a group), which is kept and attached instead
+    TaskResult.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+    recorded = TaskResult.objects.filter(
+        pk__in=[row.pk for row in rows], group__isnull=True
+    )
+    attached_failed = recorded.filter(status=TaskResultStatus.FAILED).update(
+        group=group
+    )
+    attached = recorded.update(group=group) + attached_failed
+    finished += attached
+    failed += attached_failed
+
+    if finished:
+        _count_finished(group.pk, finished, failed)
+    else:
+        enqueue_group_callback(group.pk)  # Complete right away, when empty
+
+    group.refresh_from_db()
+    return group
+
+
+def record_member_finished(result_id: str, status: str) -> bool:
+    """
+    Record that the task result `result_id` finished with `status`, counting it
+    towards its group, if any. Repeated reports of a result are ignored.
+    Returns whether the report was recorded.
+    """
+    if status not in FINISHED_STATUSES:
+        raise ValueError(f"Not a finished status: {status}")
+
+    now = timezone.now()
+    for _ in range(2):
+        updated = (
+            TaskResult.objects.filter(pk=result_id)
+            .exclude(status__in=FINISHED_STATUSES)
+            .update(status=status, finished_at=now, updated_at=now)
+        )
+        if updated:
+            break
+
+        # Either a repeated report, or it overtook the result being recorded
+        _, created = TaskResult.objects.get_or_create(
+            pk=result_id, defaults={"status": status, "finished_at": now}
+        )
+        if created:
+            return True  # Counted by `enqueue_group` when the result is attached
+    else:
+        return False
+
+    group_id = TaskResult.objects.values_list("group_id", flat=True).get(pk=result_id)
+    if group_id is not None:
+        _count_finished(group_id, 1, int(status == TaskResultStatus.FAILED))
+    return True
+
+
+def enqueue_group_callback(group_id) -> EnqueuedTaskResult | None:
+    """
+    Enqueue the callback of a complete group, unless it already was. The group
+    row is claimed with a conditional update, so that only one caller enqueues
+    it. If enqueueing fails, or raises, the claim is released for a later retry.
+    """
+    claimed = TaskGroup.objects.filter(
+        pk=group_id,
+        finished__gte=F("size"),
+        callback__isnull=False,
+        callback_enqueued_at__isnull=True,
+    ).update(callback_enqueued_at=timezone.now())
+    if not claimed:
+        return None
+
+    group = TaskGroup.objects.get(pk=group_id)
+    try:
+        callback = import_string(group.callback).using(
+            backend=group.callback_backend,
+            queue_name=group.callback_queue_name,
+            priority=group.callback_priority,
+            run_after=group.callback_run_after,
+        )
+        result = callback.enqueue(
+            *group.callback_args, group_id=str(group.pk), **group.callback_kwargs
+        )
+    except BaseException:
+        TaskGroup.objects.filter(pk=group_id).update(callback_enqueued_at=None)
+        raise
+
+    if result.status == TaskResultStatus.FAILED:
+        TaskGroup.objects.filter(pk=group_id).update(callback_enqueued_at=None)
+    else:
+        TaskGroup.objects.filter(pk=group_id).update(callback_result_id=result.id)
+
+    return result
@@ -0,0 +1,163 @@
+import gzip
+from datetime import timedelta
+from json import dumps
+from time import sleep
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.db.models.fields.tuple_lookups import TupleGreaterThan
+from django.tasks import TaskResultStatus
+from django.utils import timezone
+
+from django_tasks_cloud.base.models import TaskGroup, TaskResult
+
+
+def get_retention() -> dict[str, timedelta]:
+    retention = getattr(settings, "TASKS_CLOUD_RESULT_RETENTION", {})
+
+    periods = {}
+    for status, days in retention.items():
+        if status not in TaskResultStatus.values:
+            raise ImproperlyConfigured(
+                f"Invalid: TASKS_CLOUD_RESULT_RETENTION status '{status}'"
+            )
+        if days is None:
+            continue  # Retained indefinitely
+        if not isinstance(days, int) or days < 0:
+            raise ImproperlyConfigured(
+                f"Invalid: TASKS_CLOUD_RESULT_RETENTION['{status}'] = {days!r}"
+            )
+        periods[status] = timedelta(days=days)
+
+    return periods
+
+
+def get_group_retention() -> timedelta | None:
+    days = getattr(settings, "TASKS_CLOUD_GROUP_RETENTION", None)
+    if days is None:
+        return None  # Retained indefinitely
+    if not isinstance(days, int) or days < 0:
+        raise ImproperlyConfigured(f"Invalid: TASKS_CLOUD_GROUP_RETENTION = {days!r}")
+
+    return timedelta(days=days)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete task results older than the retention configured per status in "
+        "TASKS_CLOUD_RESULT_RETENTION, in batches ordered by creation time, and "
+        "task groups not updated within TASKS_CLOUD_GROUP_RETENTION."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--status",
+            action="append",
+            choices=TaskResultStatus.values,
+            help="Only prune this status (repeatable), and no groups. Defaults to "
+            "every configured status, and groups.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows deleted per transaction.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches.",
+        )
+        parser.add_argument(
+            "--archive",
+            help="Append pruned rows to this gzip-compressed JSONL file first.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the rows that would be pruned without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options["sleep"] < 0:
+            raise CommandError("--sleep must not be negative")
+
+        retention = get_retention()
+        group_retention = get_group_retention()
+        statuses = options["status"] or list(retention)
+        now = timezone.now()
+        verb = "Would prune" if options["dry_run"] else "Pruned"
+        batching = {
+            "batch_size": options["batch_size"],
+            "pause": options["sleep"],
+            "dry_run": options["dry_run"],
+        }
+
+        archive = None
+        if options["archive"] and not options["dry_run"]:
+            archive = gzip.open(options["archive"], "at", encoding="utf-8")
+
+        try:
+            for status in statuses:
+                if status not in retention:
+                    self.stdout.write(f"{status}: No retention configured, skipped")
+                    continue
+
+                expired = TaskResult.objects.filter(
+                    status=status, created_at__lt=now - retention[status]
+                )
+                pruned = self._prune(expired, "created_at", archive, **batching)
+                self.stdout.write(f"{status}: {verb} {pruned} result(s)")
+
+            if group_retention is not None and not options["status"]:
+                # Complete or not: a group idle for that long is abandoned
+                expired = TaskGroup.objects.filter(updated_at__lt=now - group_retention)
+                pruned = self._prune(expired, "updated_at", archive, **batching)
+                self.stdout.write(f"Groups: {verb} {pruned} group(s)")
+        finally:
+            if archive is not None:
+                archive.close()
+
+    def _prune(self, expired, field, archive, *, batch_size, pause, dry_run) -> int:
+        # Paged by the (`field`, pk) keyset, which the (status, created_at, id)
+        # and (updated_at, id) indexes serve in order. The lower bound is a row
+        # value comparison, which the database seeks to (it cannot seek on the
+        # equivalent OR), so that every batch is a range scan starting at the
+        # last key rather than at the beginning of the range.
+        expired = expired.order_by(field, "pk")
+
+        pruned = 0
+        last = None
+        while True:
+            batch = expired
+            if last is not None:
+                batch = expired.filter(TupleGreaterThan((F(field), F("pk")), last))
+            keys = list(batch.values_list(field, "pk")[:batch_size])
+            if not keys:
+                break
+            last = keys[-1]
+            pks = [pk for _, pk in keys]
+
+            if dry_run:
+                pruned += len(pks)
+                continue
+
+            with transaction.atomic():
+                rows = expired.model.objects.filter(pk__in=pks)
+                if archive is not None:
+                    for row in rows.order_by(field, "pk").values():
+                        archive.write(dumps(row, cls=DjangoJSONEncoder) + "\n")
+                    archive.flush()
+                pruned += rows.delete()[0]
+
+            if pause:
+                sleep(pause)
+
+        return pruned
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("base", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="taskresult",
+            index=models.Index(
+                fields=["status", "created_at", "id"], name="taskresult_status_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="taskresult",
+            index=models.Index(
+                fields=["backend", "status", "enqueued_at"],
+                name="taskresult_backend_status_enq",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="taskresult",
+            index=models.Index(
+                fields=["task", "status"], name="taskresult_task_status"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="taskresult",
+            index=models.Index(fields=["created_at"], name="taskresult_created"),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-19 06:47
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("base", "0002_taskresult_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskGroup",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("size", models.PositiveIntegerField()),
+                ("finished", models.PositiveIntegerField(default=0)),
+                ("failed", models.PositiveIntegerField(default=0)),
+                ("callback", models.CharField(blank=True, max_length=255, null=True)),
+                (
+                    "callback_backend",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                (
+                    "callback_queue_name",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("callback_priority", models.IntegerField(blank=True, null=True)),
+                ("callback_run_after", models.DateTimeField(blank=True, null=True)),
+                (
+                    "callback_args",
+                    models.JSONField(blank=True, default=list, null=True),
+                ),
+                (
+                    "callback_kwargs",
+                    models.JSONField(blank=True, default=dict, null=True),
+                ),
+                ("callback_enqueued_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "callback_result_id",
+                    models.CharField(blank=True, max_length=64, null=True),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["updated_at", "id"], name="taskgroup_updated")
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="taskresult",
+            name="group",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="results",
+                to="base.taskgroup",
+            ),
+        ),
+    ]
@@ -1,7 +1,41 @@
+from uuid import uuid4
+
 from django.db import models
 from django.tasks import TaskResultStatus
 
 
+class TaskGroup(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    size = models.PositiveIntegerField()
+
+    # Incremented atomically as members finish, never recounted from results
+    finished = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+
+    callback = models.CharField(max_length=255, blank=True, null=True)
+    callback_backend = models.CharField(max_length=255, blank=True, null=True)
+    callback_queue_name = models.CharField(max_length=255, blank=True, null=True)
+    callback_priority = models.IntegerField(blank=True, null=True)
+    callback_run_after = models.DateTimeField(blank=True, null=True)
+    callback_args = models.JSONField(blank=True, null=True, default=list)
+    callback_kwargs = models.JSONField(blank=True, null=True, default=dict)
+    callback_enqueued_at = models.DateTimeField(blank=True, null=True)
+    callback_result_id = models.CharField(max_length=64, blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Retention pruning (paged by updated_at, id)
+            models.Index(fields=["updated_at", "id"], name="taskgroup_updated"),
+        ]
+
+    @property
+    def is_complete(self) -> bool:
+        return self.finished >= self.size
+
+
 class TaskResult(models.Model):
     id = models.CharField(max_length=64, primary_key=True)
     task = models.CharField(max_length=255, blank=True, null=True)
@@ -19,11 +53,36 @@ class TaskResult(models.Model):
     args = models.JSONField(blank=True, null=True, default=list)
     kwargs = models.JSONField(blank=True, null=True, default=dict)
 
+    group = models.ForeignKey(
+        TaskGroup,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="results",
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     _FROZEN_ONCE_SET = ("id", "enqueued_at", "args", "kwargs")
 
+    class Meta:
+        indexes = [
+            # Retention pruning (paged by created_at, id) and status dashboards
+            models.Index(
+                fields=["status", "created_at", "id"],
+                name="taskresult_status_created",
+            ),
+            # Per back-end listings, ordered by enqueue time
+            models.Index(
+                fields=["backend", "status", "enqueued_at"],
+                name="taskresult_backend_status_enq",
+            ),
+            # Per task listings
+            models.Index(fields=["task", "status"], name="taskresult_task_status"),
+            models.Index(fields=["created_at"], name="taskresult_created"),
+        ]
+
     def save(self, *args, **kwargs):
         if self._state.adding:
             super().save(*args, **kwargs)
@@ -0,0 +1,141 @@
+from collections.abc import Callable
+from contextlib import contextmanager
+from threading import Condition
+from typing import Any
+
+from django_tasks_cloud.base.shared import get_shared, pop_shared
+
+
+class PoolClosed(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """
+    A bounded pool of connections (senders, clients, ...) to one destination.
+    Each connection is used by one thread at a time, via `checkout()`, so that
+    concurrent callers scale up to `size` connections instead of contending on
+    one. Connections raising any of `discard_on` while checked out are closed
+    and replaced by new ones; reconnecting otherwise is left to the SDKs.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int,
+        discard_on: tuple[type[BaseException], ...] = (),
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.factory = factory
+        self.size = size
+        self.discard_on = discard_on
+        self._idle = []
+        self._opened = 0
+        self._closed = False
+        self._condition = Condition()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _acquire(self):
+        with self._condition:
+            while not self._idle and self._opened >= self.size:
+                if self._closed:
+                    raise PoolClosed
+                self._condition.wait()
+            if self._closed:
+                raise PoolClosed
+
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+
+        # Opened outside the lock, so that a slow handshake blocks no one else
+        try:
+            return self.factory()
+        except BaseException:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, connection, discard: bool):
+        with self._condition:
+            if discard or self._closed:
+                self._opened -= 1
+            else:
+                self._idle.append(connection)
+                connection = None
+            self._condition.notify()
+
+        if connection is not None:
+            self._close(connection)
+
+    @staticmethod
+    def _close(connection):
+        close = getattr(connection, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception:
+            pass  # Already broken, which is why it is being closed
+
+    @contextmanager
+    def _lend(self, connection):
+        try:
+            yield connection
+        except self.discard_on:
+            self._release(connection, discard=True)
+            raise
+        except BaseException:
+            self._release(connection, discard=False)
+            raise
+        self._release(connection, discard=False)
+
+    def checkout(self):
+        return self._lend(self._acquire())
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._condition.notify_all()
+
+        for connection in idle:
+            self._close(connection)
+
+
+def get_shared_pool(
+    alias: str, destination: str, build: Callable[[], ConnectionPool]
+) -> ConnectionPool:
+    """
+    The pool of `destination` for the back-end `alias`, shared by all of its
+    instances (one per thread), built with `build` on first use.
+    """
+    return get_shared(
+        alias, ("pool", destination), build, is_stale=lambda pool: pool.closed
+    )
+
+
+def checkout_shared(alias: str, destination: str, build: Callable[[], ConnectionPool]):
+    """
+    `checkout()` from the shared pool of `destination`. A pool closed meanwhile
+    (by `close()` on the instance of another thread) is replaced with a new one,
+    instead of failing.
+    """
+    while True:
+        pool = get_shared_pool(alias, destination, build)
+        try:
+            return pool._lend(pool._acquire())
+        except PoolClosed:
+            continue
+
+
+def close_shared_pools(alias: str):
+    for pool in pop_shared(alias, "pool"):
+        pool.close()
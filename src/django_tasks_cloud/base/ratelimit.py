@@ -0,0 +1,251 @@
+from math import ceil
+from threading import Lock
+from time import monotonic, sleep, time
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from django_tasks_cloud.base.shared import get_shared
+
+MODE_BLOCK = "block"
+MODE_SHED = "shed"
+MODE_DEFER = "defer"
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    A token bucket per dimension (e.g., messages and bytes), refilled at `rates`
+    tokens per second up to `bursts` tokens. State is local to the process.
+    """
+
+    def __init__(self, rates: tuple[float, ...], bursts: tuple[float, ...]):
+        self.rates = rates
+        self.bursts = bursts
+        self._state = None
+        self._lock = Lock()
+
+    def _take(self, state, amounts, now, debt):
+        tokens, last = state or (self.bursts, now)
+        tokens = [
+            min(burst, level + (now - last) * rate)
+            for level, rate, burst in zip(tokens, self.rates, self.bursts)
+        ]
+        # A request larger than the burst could never be served otherwise
+        amounts = [min(amount, burst) for amount, burst in zip(amounts, self.bursts)]
+
+        wait = max(
+            (
+                (amount - level) / rate
+                for amount, level, rate in zip(amounts, tokens, self.rates)
+                if amount > level
+            ),
+            default=0.0,
+        )
+        if wait and not debt:
+            return (tokens, now), wait
+
+        tokens = [level - amount for level, amount in zip(tokens, amounts)]
+        return (tokens, now), wait
+
+    def take(self, amounts: tuple[float, ...], debt: bool) -> float:
+        """
+        Take `amounts` tokens and return the seconds until they are available.
+        Without `debt`, nothing is taken unless they are available right away.
+        """
+        with self._lock:
+            self._state, wait = self._take(self._state, amounts, monotonic(), debt)
+        return wait
+
+
+class CacheWindowCounter:
+    """
+    Limits shared between processes via a cache. Each dimension is counted in
+    fixed windows of `burst / rate` seconds, each admitting `burst` tokens,
+    using only the atomic `add` and `incr` of the cache: usually one round trip
+    per dimension and message, without any lock. Up to twice `burst` tokens may
+    pass around a window boundary.
+
+    With `debt`, a message that does not fit in the current window is counted
+    in the first later window with room. Without it, its tokens are given back.
+    If the cache fails (not when it is busy), the process falls back to a local
+    `TokenBucket`, so that the limit holds per process until the cache is back.
+    """
+
+    def __init__(self, rates, bursts, cache_alias, key: str):
+        self.rates = rates
+        self.bursts = bursts
+        self.cache_alias = cache_alias
+        self.key = key
+        self.fallback = TokenBucket(rates, bursts)
+
+    @property
+    def cache(self):
+        # Cache connections are per thread, unlike the counter
+        return caches[self.cache_alias]
+
+    def _incr(self, key: str, amount: int, timeout: int) -> int:
+        try:
+            return self.cache.incr(key, amount)
+        except ValueError:  # Missing: the first message of its window
+            if self.cache.add(key, amount, timeout=timeout):
+                return amount
+            return self.cache.incr(key, amount)  # Added by another process
+
+    def _decr(self, key: str, amount: int):
+        try:
+            self.cache.decr(key, amount)
+        except ValueError:
+            pass  # Expired along with its window
+
+    def _reserve(self, dimension, amount, now, debt) -> tuple[str, float, bool]:
+        rate, burst = self.rates[dimension], self.bursts[dimension]
+        window = burst / rate
+        # A request larger than the burst could never be served otherwise
+        amount = min(amount, int(burst))
+        index = int(now / window)
+        while True:
+            key = f"{self.key}:{dimension}:{index}"
+            timeout = ceil((index + 1) * window - now) + 1
+            used = self._incr(key, amount, timeout)
+            if used <= burst:
+                return key, max(0.0, index * window - now), True
+            if not debt:
+                return key, (index + 1) * window - now, False
+            # Skip the windows filled by those counted before us
+            index += max(1, int((used - amount) // burst))
+
+    def take(self, amounts, debt):
+        now = time()  # Comparable across processes (and hosts)
+        reserved, wait = [], 0.0
+        try:
+            for dimension, amount in enumerate(amounts):
+                key, delay, admitted = self._reserve(dimension, amount, now, debt)
+                reserved.append((key, min(amount, int(self.bursts[dimension]))))
+                wait = max(wait, delay)
+                if not admitted:
+                    for reserved_key, reserved_amount in reserved:
+                        self._decr(reserved_key, reserved_amount)
+                    return wait
+        except Exception:
+            return self.fallback.take(amounts, debt)  # Cache unavailable
+        return wait
+
+
+class RateLimiter:
+    """
+    Enforces the `RATE_LIMITS` option of a back-end: per destination limits on
+    messages and bytes per second, with `"*"` applying to every destination
+    without an entry of its own. What happens when a bucket is empty is set by
+    `RATE_LIMIT_MODE`.
+    """
+
+    def __init__(self, alias, limits=None, mode=MODE_BLOCK, cache_alias=None):
+        if mode not in (MODE_BLOCK, MODE_SHED, MODE_DEFER):
+            raise ImproperlyConfigured(f"Invalid: RATE_LIMIT_MODE = {mode!r}")
+
+        self.alias = alias
+        self.limits = limits or {}
+        self.mode = mode
+        self.cache_alias = cache_alias
+        self._buckets: dict[
+            str, tuple[TokenBucket | CacheWindowCounter, tuple[bool, bool]] | None
+        ] = {}
+        self._lock = Lock()
+
+        for destination, limit in self.limits.items():
+            if not limit.get("MESSAGES_PER_SECOND") and not limit.get(
+                "BYTES_PER_SECOND"
+            ):
+                raise ImproperlyConfigured(
+                    f"Unset: RATE_LIMITS['{destination}'] MESSAGES_PER_SECOND or "
+                    "BYTES_PER_SECOND"
+                )
+
+    @classmethod
+    def from_backend(cls, backend) -> "RateLimiter":
+        mode = backend.options.get("RATE_LIMIT_MODE", MODE_BLOCK)
+        if mode == MODE_DEFER and not backend.supports_defer:
+            raise ImproperlyConfigured(
+                f"Invalid: RATE_LIMIT_MODE = '{MODE_DEFER}' ({backend.alias} does "
+                "not support deferred tasks)"
+            )
+
+        return cls(
+            backend.alias,
+            backend.options.get("RATE_LIMITS"),
+            mode,
+            backend.options.get("RATE_LIMIT_CACHE"),
+        )
+
+    def _build_bucket(self, destination):
+        limit = self.limits.get(destination, self.limits.get("*"))
+        if not limit:
+            return None
+
+        rates, bursts, dimensions = [], [], []
+        for rate_key, burst_key in (
+            ("MESSAGES_PER_SECOND", "BURST"),
+            ("BYTES_PER_SECOND", "BYTES_BURST"),
+        ):
+            rate = limit.get(rate_key)
+            dimensions.append(bool(rate))
+            if rate:
+                rates.append(float(rate))
+                bursts.append(float(limit.get(burst_key, rate)))
+
+        rates, bursts = tuple(rates), tuple(bursts)
+
+        def build():
+            if self.cache_alias is None:
+                return TokenBucket(rates, bursts)
+            return CacheWindowCounter(
+                rates,
+                bursts,
+                self.cache_alias,
+                f"django-tasks-cloud:ratelimit:{self.alias}:{destination}",
+            )
+
+        # Keyed by the limits too, so that a changed configuration is honoured
+        bucket = get_shared(
+            self.alias,
+            ("bucket", destination, rates, bursts, self.cache_alias),
+            build,
+        )
+
+        return bucket, tuple(dimensions)
+
+    def _get_bucket(self, destination):
+        if destination not in self._buckets:
+            with self._lock:
+                if destination not in self._buckets:
+                    self._buckets[destination] = self._build_bucket(destination)
+        return self._buckets[destination]
+
+    def acquire(self, destination: str, size: int) -> float:
+        """
+        Account for one message of `size` bytes sent to `destination`. Returns
+        the seconds to defer the message by, which is only non-zero in the
+        `defer` mode. Raises `RateLimitExceeded` in the `shed` mode.
+        """
+        entry = self._get_bucket(destination)
+        if entry is None:
+            return 0.0
+
+        bucket, (by_messages, by_bytes) = entry
+        amounts = (1,) * by_messages + (size,) * by_bytes
+        wait = bucket.take(amounts, debt=self.mode != MODE_SHED)
+        if not wait:
+            return 0.0
+
+        if self.mode == MODE_SHED:
+            raise RateLimitExceeded(
+                f"Rate limit exceeded for '{destination}' on '{self.alias}'"
+            )
+        if self.mode == MODE_BLOCK:
+            sleep(wait)
+            return 0.0
+        return wait
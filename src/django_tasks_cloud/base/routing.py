@@ -0,0 +1,152 @@
+from contextlib import contextmanager
+from hashlib import blake2b
+from math import log
+from threading import Lock
+from time import monotonic
+
+from django.core.exceptions import ImproperlyConfigured
+
+from django_tasks_cloud.base.shared import get_shared
+
+STRATEGY_HASH = "hash"
+STRATEGY_ROUND_ROBIN = "round_robin"
+
+
+class _Partition:
+    def __init__(self, name: str, config: dict):
+        destinations = config.get("DESTINATIONS")
+        if not destinations:
+            raise ImproperlyConfigured(f"Unset: PARTITIONS['{name}']['DESTINATIONS']")
+        if not isinstance(destinations, dict):
+            destinations = dict.fromkeys(destinations, 1)
+        if any(not isinstance(w, int) or w < 1 for w in destinations.values()):
+            raise ImproperlyConfigured(
+                f"Invalid: PARTITIONS['{name}']['DESTINATIONS'] weights must be "
+                "positive integers"
+            )
+
+        self.strategy = config.get("STRATEGY", STRATEGY_ROUND_ROBIN)
+        if self.strategy not in (STRATEGY_HASH, STRATEGY_ROUND_ROBIN):
+            raise ImproperlyConfigured(
+                f"Invalid: PARTITIONS['{name}']['STRATEGY'] = {self.strategy!r}"
+            )
+
+        self.key = config.get("KEY")
+        if self.strategy == STRATEGY_HASH and not self.key:
+            raise ImproperlyConfigured(f"Unset: PARTITIONS['{name}']['KEY']")
+
+        self.cooldown = config.get("COOLDOWN", 30)
+        self.weights: dict[str, int] = destinations
+        self._current = dict.fromkeys(destinations, 0)
+        self._unhealthy_until: dict[str, float] = {}
+        self._lock = Lock()
+
+    def _healthy(self) -> list[str]:
+        now = monotonic()
+        healthy = [
+            destination
+            for destination in self.weights
+            if self._unhealthy_until.get(destination, 0) <= now
+        ]
+        # All shards failing: spread over all of them rather than refusing work
+        return healthy or list(self.weights)
+
+    def _by_hash(self, key, candidates: list[str]) -> str:
+        # Weighted rendezvous hashing: a key keeps its shard while that shard is
+        # healthy, and only the keys of a failed shard move elsewhere.
+        def score(destination):
+            digest = blake2b(f"{key}:{destination}".encode(), digest_size=8).digest()
+            uniform = (int.from_bytes(digest) + 1) / (2**64 + 1)
+            return -self.weights[destination] / log(uniform)
+
+        return max(candidates, key=score)
+
+    def _by_round_robin(self, candidates: list[str]) -> str:
+        # Smooth weighted round robin (as in nginx upstreams)
+        total = 0
+        for destination in candidates:
+            self._current[destination] += self.weights[destination]
+            total += self.weights[destination]
+        chosen = max(candidates, key=self._current.__getitem__)
+        self._current[chosen] -= total
+        return chosen
+
+    def pick(self, kwargs: dict) -> str:
+        with self._lock:
+            candidates = self._healthy()
+            if self.strategy == STRATEGY_HASH and self.key in kwargs:
+                return self._by_hash(kwargs[self.key], candidates)
+            # Tasks without a key are spread evenly
+            return self._by_round_robin(candidates)
+
+    def mark_unhealthy(self, destination: str):
+        with self._lock:
+            self._unhealthy_until[destination] = monotonic() + self.cooldown
+
+    def mark_healthy(self, destination: str):
+        with self._lock:
+            self._unhealthy_until.pop(destination, None)
+
+
+class DestinationRouter:
+    """
+    Maps a logical destination (a queue, topic or function name) to one of
+    several physical destinations, configured through the `PARTITIONS` option of
+    a back-end. Names without a partition are routed to themselves. Routers of
+    the same `alias` share their state.
+
+    A destination raising any of `unhealthy_on` (errors of the destination, such
+    as transport failures or throttling, rather than of the message) is skipped
+    for its `COOLDOWN` seconds.
+    """
+
+    def __init__(
+        self,
+        partitions: dict | None = None,
+        alias: str | None = None,
+        unhealthy_on: tuple[type[BaseException], ...] = (),
+    ):
+        self.unhealthy_on = unhealthy_on
+        self._partitions = {}
+        for name, config in (partitions or {}).items():
+            if alias is None:
+                self._partitions[name] = _Partition(name, config)
+                continue
+
+            # Keyed by the configuration too, so that a change is honoured
+            self._partitions[name] = get_shared(
+                alias,
+                ("partition", name, repr(config)),
+                lambda name=name, config=config: _Partition(name, config),
+            )
+
+    @classmethod
+    def from_backend(
+        cls, backend, unhealthy_on: tuple[type[BaseException], ...] = ()
+    ) -> "DestinationRouter":
+        return cls(backend.options.get("PARTITIONS"), backend.alias, unhealthy_on)
+
+    def destinations(self, name: str) -> list[str]:
+        """Every physical destination of `name`, for consumers to read from."""
+        partition = self._partitions.get(name)
+        return list(partition.weights) if partition else [name]
+
+    @contextmanager
+    def route(self, name: str, kwargs: dict | None = None):
+        """
+        Yield the physical destination to publish to. A shard that raises one
+        of `unhealthy_on` is skipped for its `COOLDOWN` seconds.
+        """
+        partition = self._partitions.get(name)
+        if partition is None:
+            yield name
+            return
+
+        destination = partition.pick(kwargs or {})
+        try:
+            yield destination
+        except self.unhealthy_on:
+            partition.mark_unhealthy(destination)
+            raise
+        # Other errors (of the message, say) propagate, leaving the shard as is
+        partition.mark_healthy(destination)
@@ -0,0 +1,38 @@
+from collections.abc import Callable
+from threading import Lock
+from typing import Any
+
+# Django builds one back-end instance per thread (`task_backends` is thread
+# local). State that must hold per process, such as partition health, rate
+# limit buckets, connection pools and cached queue statistics, is therefore
+# kept here, shared by every instance of a back-end alias.
+_shared: dict[tuple, Any] = {}
+_shared_lock = Lock()
+
+
+def get_shared(
+    alias: str,
+    key: tuple,
+    build: Callable[[], Any],
+    is_stale: Callable[[Any], bool] | None = None,
+) -> Any:
+    """
+    The object stored under `key` for the back-end `alias`, built with `build`
+    on first use, or when `is_stale` says the stored one can no longer be used.
+    """
+    full_key = (alias, *key)
+    with _shared_lock:
+        value = _shared.get(full_key)
+        if value is None or (is_stale is not None and is_stale(value)):
+            value = _shared[full_key] = build()
+        return value
+
+
+def pop_shared(alias: str, kind: str) -> list:
+    """
+    Remove, and return, every object of the back-end `alias` whose key starts
+    with `kind`.
+    """
+    with _shared_lock:
+        keys = [key for key in _shared if key[0] == alias and key[1] == kind]
+        return [_shared.pop(key) for key in keys]
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Lock
+from time import monotonic
+
+from django_tasks_cloud.base.routing import DestinationRouter
+from django_tasks_cloud.base.shared import get_shared
+
+
+@dataclass(frozen=True)
+class QueueStats:
+    backend: str
+    destination: str | None  # None when the back-end itself failed
+    depth: int | None = None  # Messages available to consumers
+    in_flight: int | None = None  # Received, but neither deleted nor expired
+    scheduled: int | None = None  # Delayed or scheduled for later
+    oldest_age: float | None = None  # Seconds since the oldest message arrived
+    error: str | None = None
+
+
+class _CachedQueueStats:
+    def __init__(self):
+        self.stats: list[QueueStats] | None = None
+        self.expires_at = 0.0
+        self.lock = Lock()
+
+
+class QueueStatsMixin:
+    """
+    Adds `get_queue_stats()` to a back-end: approximate depth, in-flight count
+    and age for every (physical) destination in `QUEUES`. Provider calls are
+    fanned out concurrently, and results are cached per process for
+    `QUEUE_STATS_TTL` seconds, so any number of callers (and threads) share one
+    call per destination per TTL.
+
+    Back-ends implement `_fetch_queue_stats(destination)`, and set
+    `supports_queue_stats`.
+    """
+
+    supports_queue_stats = False
+
+    alias: str
+    options: dict
+    queues: set[str]
+    router: DestinationRouter
+
+    def __init__(self, alias, params):
+        super().__init__(alias, params)  # type: ignore[reportCallIssue]
+        self.queue_stats_ttl = self.options.get("QUEUE_STATS_TTL", 15)
+
+    def _fetch_queue_stats(self, destination: str) -> QueueStats:
+        raise NotImplementedError
+
+    def _safe_fetch_queue_stats(self, destination: str) -> QueueStats:
+        try:
+            return self._fetch_queue_stats(destination)
+        except Exception as exc:
+            return QueueStats(
+                self.alias,
+                destination,
+                error=f"{exc.__class__.__module__}.{exc.__class__.__qualname__}",
+            )
+
+    def get_queue_stats(self) -> list[QueueStats]:
+        if not self.supports_queue_stats:
+            raise NotImplementedError(
+                "This backend does not support retrieving queue statistics."
+            )
+
+        cached = get_shared(self.alias, ("queue_stats",), _CachedQueueStats)
+
+        # Callers arriving during a refresh wait for it, instead of starting
+        # their own
+        with cached.lock:
+            if cached.stats is None or monotonic() >= cached.expires_at:
+                destinations = [
+                    destination
+                    for name in sorted(self.queues)
+                    for destination in self.router.destinations(name)
+                ]
+                with ThreadPoolExecutor(
+                    max_workers=min(8, len(destinations) or 1)
+                ) as executor:
+                    cached.stats = list(
+                        executor.map(self._safe_fetch_queue_stats, destinations)
+                    )
+                cached.expires_at = monotonic() + self.queue_stats_ttl
+
+            return cached.stats
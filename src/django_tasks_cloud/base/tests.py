@@ -1 +1,743 @@
-from django.test import TestCase
+import gzip
+import json
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.tasks import TaskResultStatus, task, task_backends
+from django.tasks.backends.dummy import DummyBackend
+from django.tasks.signals import task_enqueued
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from django_tasks_cloud.base.groups import (
+    enqueue_group,
+    enqueue_group_callback,
+    record_member_finished,
+)
+from django_tasks_cloud.base.models import TaskGroup, TaskResult
+from django_tasks_cloud.base.pool import (
+    ConnectionPool,
+    checkout_shared,
+    close_shared_pools,
+    get_shared_pool,
+)
+from django_tasks_cloud.base.ratelimit import (
+    CacheWindowCounter,
+    RateLimiter,
+    RateLimitExceeded,
+)
+from django_tasks_cloud.base.routing import DestinationRouter
+from django_tasks_cloud.base.shared import get_shared, pop_shared
+from django_tasks_cloud.base.stats import QueueStats, QueueStatsMixin
+
+
+@override_settings(TASKS_CLOUD_RESULT_RETENTION={"SUCCESSFUL": 7, "FAILED": None})
+class PruneTaskResultsTests(TestCase):
+    def setUp(self):
+        for i in range(25):
+            TaskResult.objects.create(id=f"successful-{i:02}", status="SUCCESSFUL")
+        for i in range(5):
+            TaskResult.objects.create(id=f"failed-{i:02}", status="FAILED")
+
+        self.expired_at = timezone.now() - timedelta(days=8)
+        TaskResult.objects.filter(id__lt="successful-20").update(
+            created_at=self.expired_at
+        )
+        TaskResult.objects.filter(status="FAILED").update(created_at=self.expired_at)
+
+    def prune(self, *args):
+        stdout = StringIO()
+        call_command("prune_task_results", "--sleep", "0", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_prunes_expired_results_in_batches(self):
+        output = self.prune("--batch-size", "3")
+
+        self.assertIn("SUCCESSFUL: Pruned 20 result(s)", output)
+        self.assertEqual(TaskResult.objects.filter(status="SUCCESSFUL").count(), 5)
+        self.assertFalse(
+            TaskResult.objects.filter(
+                status="SUCCESSFUL", id__lt="successful-20"
+            ).exists()
+        )
+
+    def test_statuses_without_retention_are_kept(self):
+        self.prune("--status", "FAILED")
+
+        self.assertEqual(TaskResult.objects.filter(status="FAILED").count(), 5)
+
+    def test_batches_sharing_a_creation_time_are_all_pruned(self):
+        # Every expired row has the same created_at, so paging relies on the pk
+        self.assertEqual(
+            TaskResult.objects.filter(created_at=self.expired_at).count(), 25
+        )
+        self.prune("--batch-size", "1")
+
+        self.assertFalse(
+            TaskResult.objects.filter(
+                status="SUCCESSFUL", created_at=self.expired_at
+            ).exists()
+        )
+
+    def test_archives_rows_before_deleting(self):
+        with TemporaryDirectory() as directory:
+            archive = Path(directory) / "results.jsonl.gz"
+            self.prune("--batch-size", "7", "--archive", str(archive))
+
+            with gzip.open(archive, "rt", encoding="utf-8") as lines:
+                rows = [json.loads(line) for line in lines]
+
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(
+            sorted(row["id"] for row in rows),
+            [f"successful-{i:02}" for i in range(20)],
+        )
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.prune("--batch-size", "6", "--dry-run")
+
+        self.assertIn("SUCCESSFUL: Would prune 20 result(s)", output)
+        self.assertEqual(TaskResult.objects.count(), 30)
+
+    def test_rejects_non_positive_batch_size(self):
+        for batch_size in ("0", "-1"):
+            with self.subTest(batch_size=batch_size):
+                with self.assertRaises(CommandError):
+                    self.prune("--batch-size", batch_size)
+
+    @override_settings(TASKS_CLOUD_RESULT_RETENTION={"DONE": 7})
+    def test_rejects_unknown_status_in_retention(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.prune()
+
+    @override_settings(TASKS_CLOUD_GROUP_RETENTION=7)
+    def test_prunes_idle_groups_keeping_their_results(self):
+        idle, active = (
+            TaskGroup.objects.create(size=1),
+            TaskGroup.objects.create(size=1),
+        )
+        TaskGroup.objects.filter(pk=idle.pk).update(updated_at=self.expired_at)
+        TaskResult.objects.filter(pk="successful-24").update(group=idle)
+
+        self.assertIn("Groups: Would prune 1 group(s)", self.prune("--dry-run"))
+        self.prune("--status", "SUCCESSFUL")
+        self.assertEqual(TaskGroup.objects.count(), 2)
+
+        output = self.prune("--batch-size", "1")
+
+        self.assertIn("Groups: Pruned 1 group(s)", output)
+        self.assertEqual(list(TaskGroup.objects.all()), [active])
+        self.assertIsNone(TaskResult.objects.get(pk="successful-24").group)
+
+    @override_settings(TASKS_CLOUD_GROUP_RETENTION="7")
+    def test_rejects_invalid_group_retention(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.prune()
+
+
+class DestinationRouterTests(SimpleTestCase):
+    def route(self, router, name, kwargs=None):
+        with router.route(name, kwargs) as destination:
+            return destination
+
+    def test_unpartitioned_names_route_to_themselves(self):
+        router = DestinationRouter()
+
+        self.assertEqual(self.route(router, "emails"), "emails")
+        self.assertEqual(router.destinations("emails"), ["emails"])
+
+    def test_round_robin_follows_weights(self):
+        router = DestinationRouter(
+            {"emails": {"DESTINATIONS": {"emails-0": 1, "emails-1": 3}}}
+        )
+
+        counts = Counter(self.route(router, "emails") for _ in range(400))
+
+        self.assertEqual(counts, {"emails-0": 100, "emails-1": 300})
+        self.assertEqual(router.destinations("emails"), ["emails-0", "emails-1"])
+
+    def test_hash_pins_a_key_to_one_destination(self):
+        router = DestinationRouter(
+            {
+                "emails": {
+                    "DESTINATIONS": ["emails-0", "emails-1", "emails-2"],
+                    "STRATEGY": "hash",
+                    "KEY": "tenant_id",
+                }
+            }
+        )
+
+        for tenant_id in range(20):
+            destinations = {
+                self.route(router, "emails", {"tenant_id": tenant_id}) for _ in range(5)
+            }
+            self.assertEqual(len(destinations), 1)
+
+        spread = {
+            self.route(router, "emails", {"tenant_id": tenant_id})
+            for tenant_id in range(100)
+        }
+        self.assertEqual(len(spread), 3)
+
+    def test_failing_destination_is_skipped_during_cooldown(self):
+        router = DestinationRouter(
+            {
+                "emails": {
+                    "DESTINATIONS": ["emails-0", "emails-1"],
+                    "STRATEGY": "hash",
+                    "KEY": "tenant_id",
+                }
+            },
+            unhealthy_on=(ConnectionError,),
+        )
+        preferred = self.route(router, "emails", {"tenant_id": 7})
+
+        with self.assertRaises(ValueError):
+            with router.route("emails", {"tenant_id": 7}) as destination:
+                raise ValueError  # The message is at fault, not the destination
+        self.assertEqual(self.route(router, "emails", {"tenant_id": 7}), preferred)
+
+        with self.assertRaises(ConnectionError):
+            with router.route("emails", {"tenant_id": 7}) as destination:
+                self.assertEqual(destination, preferred)
+                raise ConnectionError
+
+        self.assertNotEqual(self.route(router, "emails", {"tenant_id": 7}), preferred)
+
+    def test_routers_of_one_alias_share_their_state(self):
+        partitions = {"emails": {"DESTINATIONS": ["emails-0", "emails-1"]}}
+        routers = [DestinationRouter(partitions, alias="shared") for _ in range(4)]
+
+        destinations = [self.route(router, "emails") for router in routers]
+
+        self.assertEqual(destinations, ["emails-0", "emails-1"] * 2)
+
+    def test_rejects_invalid_configuration(self):
+        for partitions in (
+            {"emails": {}},
+            {"emails": {"DESTINATIONS": {"emails-0": 0}}},
+            {"emails": {"DESTINATIONS": ["emails-0"], "STRATEGY": "random"}},
+            {"emails": {"DESTINATIONS": ["emails-0"], "STRATEGY": "hash"}},
+        ):
+            with self.subTest(partitions=partitions):
+                with self.assertRaises(ImproperlyConfigured):
+                    DestinationRouter(partitions)
+
+
+@mock.patch("django_tasks_cloud.base.ratelimit.monotonic", return_value=100.0)
+class RateLimiterTests(SimpleTestCase):
+    def test_shed_raises_once_the_bucket_is_empty(self, clock):
+        limiter = RateLimiter("shed", {"*": {"MESSAGES_PER_SECOND": 2}}, mode="shed")
+
+        limiter.acquire("emails", 10)
+        limiter.acquire("emails", 10)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire("emails", 10)
+
+        clock.return_value = 100.5  # One token refilled
+        limiter.acquire("emails", 10)
+
+    def test_shed_by_bytes(self, clock):
+        limiter = RateLimiter(
+            "shed-bytes", {"emails": {"BYTES_PER_SECOND": 100}}, mode="shed"
+        )
+
+        limiter.acquire("emails", 60)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire("emails", 60)
+        limiter.acquire("unlimited", 10**6)
+
+    def test_defer_returns_growing_delays(self, clock):
+        limiter = RateLimiter(
+            "defer", {"*": {"MESSAGES_PER_SECOND": 10, "BURST": 1}}, mode="defer"
+        )
+
+        delays = [round(limiter.acquire("emails", 1), 3) for _ in range(4)]
+
+        self.assertEqual(delays, [0.0, 0.1, 0.2, 0.3])
+
+    @mock.patch("django_tasks_cloud.base.ratelimit.sleep")
+    def test_block_sleeps_until_tokens_are_available(self, sleep, clock):
+        limiter = RateLimiter(
+            "block", {"*": {"MESSAGES_PER_SECOND": 10, "BURST": 1}}, mode="block"
+        )
+
+        self.assertEqual(limiter.acquire("emails", 1), 0.0)
+        self.assertEqual(limiter.acquire("emails", 1), 0.0)
+
+        sleep.assert_called_once()
+        self.assertAlmostEqual(sleep.call_args.args[0], 0.1)
+
+    def test_buckets_are_shared_between_instances_and_threads(self, clock):
+        limits = {"*": {"MESSAGES_PER_SECOND": 2}}
+        RateLimiter("shared", limits, mode="shed").acquire("emails", 1)
+
+        thread = Thread(
+            target=RateLimiter("shared", limits, mode="shed").acquire,
+            args=("emails", 1),
+        )
+        thread.start()
+        thread.join()
+
+        with self.assertRaises(RateLimitExceeded):
+            RateLimiter("shared", limits, mode="shed").acquire("emails", 1)
+
+    def test_defer_requires_a_backend_supporting_it(self, clock):
+        backend = SimpleNamespace(
+            alias="sqs", options={"RATE_LIMIT_MODE": "defer"}, supports_defer=False
+        )
+
+        with self.assertRaises(ImproperlyConfigured):
+            RateLimiter.from_backend(backend)
+
+
+@mock.patch("django_tasks_cloud.base.ratelimit.time", return_value=100.0)
+class CacheWindowCounterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_state_is_shared_through_the_cache(self, clock):
+        first = CacheWindowCounter((1.0,), (1.0,), "default", "counter")
+        second = CacheWindowCounter((1.0,), (1.0,), "default", "counter")
+
+        self.assertEqual(first.take((1,), debt=False), 0.0)
+        self.assertEqual(second.take((1,), debt=False), 1.0)
+
+        clock.return_value = 101.0  # The next window
+        self.assertEqual(second.take((1,), debt=False), 0.0)
+
+    def test_takes_one_round_trip_per_dimension(self, clock):
+        counter = CacheWindowCounter((10.0, 100.0), (10.0, 100.0), "default", "c")
+        counter.take((1, 10), debt=False)
+
+        with (
+            mock.patch.object(cache, "incr", wraps=cache.incr) as incr,
+            mock.patch.object(cache, "add", wraps=cache.add) as add,
+        ):
+            counter.take((1, 10), debt=False)
+
+        self.assertEqual(incr.call_count, 2)
+        add.assert_not_called()
+
+    def test_rejected_messages_give_their_tokens_back(self, clock):
+        counter = CacheWindowCounter((10.0, 100.0), (10.0, 100.0), "default", "c")
+
+        self.assertEqual(counter.take((1, 60), debt=False), 0.0)
+        self.assertGreater(counter.take((1, 60), debt=False), 0.0)
+
+        self.assertEqual(cache.get("c:0:100"), 1)  # By messages
+        self.assertEqual(cache.get("c:1:100"), 60)  # By bytes
+
+    def test_debt_is_counted_in_later_windows(self, clock):
+        counter = CacheWindowCounter((10.0,), (1.0,), "default", "counter")
+
+        delays = [round(counter.take((1,), debt=True), 3) for _ in range(4)]
+
+        self.assertEqual(delays, [0.0, 0.1, 0.2, 0.3])
+
+    def test_falls_back_to_a_local_bucket_when_the_cache_fails(self, clock):
+        counter = CacheWindowCounter((1.0,), (1.0,), "default", "counter")
+
+        with mock.patch.object(cache, "incr", side_effect=ConnectionError):
+            self.assertEqual(counter.take((1,), debt=False), 0.0)
+            self.assertGreater(counter.take((1,), debt=False), 0.0)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, size=2, **kwargs):
+        self.opened = []
+
+        def factory():
+            connection = mock.Mock(name=f"connection-{len(self.opened)}")
+            self.opened.append(connection)
+            return connection
+
+        return ConnectionPool(factory, size, **kwargs)
+
+    def test_reuses_released_connections(self):
+        pool = self.make_pool()
+
+        for _ in range(3):
+            with pool.checkout():
+                pass
+
+        self.assertEqual(len(self.opened), 1)
+
+    def test_concurrent_checkouts_get_distinct_connections_up_to_size(self):
+        pool = self.make_pool(size=2)
+        checked_out = []
+
+        with pool.checkout() as first, pool.checkout() as second:
+            thread = Thread(
+                target=lambda: checked_out.append(pool.checkout().__enter__())
+            )
+            thread.start()
+            thread.join(timeout=0.1)
+            self.assertTrue(thread.is_alive())  # Waiting for a connection
+
+        thread.join()
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.opened), 2)
+        self.assertIn(checked_out[0], (first, second))
+
+    def test_discards_connections_raising_discard_on(self):
+        pool = self.make_pool(discard_on=(ConnectionError,))
+
+        with self.assertRaises(ConnectionError):
+            with pool.checkout():
+                raise ConnectionError
+        with self.assertRaises(ValueError):
+            with pool.checkout():
+                raise ValueError
+        with pool.checkout() as connection:
+            pass
+
+        self.opened[0].close.assert_called_once()
+        self.assertIs(connection, self.opened[1])
+
+    def test_failing_factory_frees_its_slot(self):
+        pool = ConnectionPool(mock.Mock(side_effect=ConnectionError), 1)
+
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                with pool.checkout():
+                    pass
+
+    def test_close_closes_idle_and_returned_connections(self):
+        pool = self.make_pool()
+        with pool.checkout() as connection, pool.checkout() as idle:
+            pass
+
+        with pool.checkout() as connection:
+            pool.close()
+            idle.close.assert_called_once()
+            connection.close.assert_not_called()
+        connection.close.assert_called_once()
+
+        with self.assertRaises(RuntimeError):
+            with pool.checkout():
+                pass
+
+    def test_checkout_shared_replaces_a_closed_pool(self):
+        build = mock.Mock(side_effect=lambda: self.make_pool(size=1))
+        checked_out = []
+
+        def checkout():
+            with checkout_shared("shared", "emails", build) as connection:
+                checked_out.append(connection)
+
+        with checkout_shared("shared", "emails", build) as connection:
+            waiting = Thread(target=checkout)
+            waiting.start()
+            waiting.join(timeout=0.1)
+            self.assertTrue(waiting.is_alive())  # The pool is exhausted
+
+            close_shared_pools("shared")  # By another thread's instance
+            waiting.join()
+
+        connection.close.assert_called_once()
+        self.assertEqual(build.call_count, 2)
+        self.assertIsNot(checked_out[0], connection)
+        close_shared_pools("shared")
+
+    def test_shared_pools_are_keyed_by_alias_and_destination(self):
+        build = mock.Mock(side_effect=lambda: self.make_pool())
+
+        first = get_shared_pool("shared", "emails", build)
+        self.assertIs(get_shared_pool("shared", "emails", build), first)
+        self.assertIsNot(get_shared_pool("shared", "sms", build), first)
+        self.assertIsNot(get_shared_pool("other", "emails", build), first)
+
+        close_shared_pools("shared")
+        self.assertTrue(first.closed)
+        self.assertIsNot(get_shared_pool("shared", "emails", build), first)
+        close_shared_pools("shared")
+        close_shared_pools("other")
+
+
+class SharedTests(SimpleTestCase):
+    def test_objects_are_built_once_per_alias_and_key(self):
+        build = mock.Mock(side_effect=object)
+
+        first = get_shared("shared", ("thing", "a"), build)
+        self.assertIs(get_shared("shared", ("thing", "a"), build), first)
+        self.assertIsNot(get_shared("other", ("thing", "a"), build), first)
+        self.assertIsNot(
+            get_shared("shared", ("thing", "a"), build, is_stale=lambda _: True),
+            first,
+        )
+        self.assertEqual(build.call_count, 3)
+
+        self.assertEqual(len(pop_shared("shared", "thing")), 1)
+        self.assertEqual(pop_shared("shared", "thing"), [])
+        pop_shared("other", "thing")
+
+
+class FakeQueueBackend(QueueStatsMixin, DummyBackend):
+    supports_queue_stats = True
+    fetched = Counter()
+
+    def __init__(self, alias, params):
+        super().__init__(alias, params)
+        self.router = DestinationRouter.from_backend(self)
+
+    def _fetch_queue_stats(self, destination):
+        self.fetched[destination] += 1
+        if destination == "broken":
+            raise ConnectionError
+        return QueueStats(self.alias, destination, depth=self.fetched[destination])
+
+
+FAKE_QUEUE_BACKEND = {
+    "BACKEND": "django_tasks_cloud.base.tests.FakeQueueBackend",
+    "QUEUES": ["emails", "sms"],
+    "OPTIONS": {"PARTITIONS": {"emails": {"DESTINATIONS": ["emails-0", "emails-1"]}}},
+}
+
+
+@override_settings(TASKS={"default": FAKE_QUEUE_BACKEND})
+class QueueStatsTests(SimpleTestCase):
+    def setUp(self):
+        FakeQueueBackend.fetched.clear()
+        pop_shared("default", "queue_stats")
+
+    def test_reports_every_physical_destination(self):
+        stats = task_backends["default"].get_queue_stats()
+
+        self.assertEqual(
+            [queue_stats.destination for queue_stats in stats],
+            ["emails-0", "emails-1", "sms"],
+        )
+
+    def test_cache_is_shared_between_instances_and_threads(self):
+        task_backends["default"].get_queue_stats()
+
+        thread = Thread(target=lambda: task_backends["default"].get_queue_stats())
+        thread.start()
+        thread.join()
+
+        self.assertEqual(
+            FakeQueueBackend.fetched, {"emails-0": 1, "emails-1": 1, "sms": 1}
+        )
+
+    @mock.patch("django_tasks_cloud.base.stats.monotonic", return_value=100.0)
+    def test_cache_expires_after_the_ttl(self, clock):
+        backend = task_backends["default"]
+        backend.get_queue_stats()
+
+        clock.return_value = 114.0
+        backend.get_queue_stats()
+        self.assertEqual(FakeQueueBackend.fetched["sms"], 1)
+
+        clock.return_value = 116.0
+        backend.get_queue_stats()
+        self.assertEqual(FakeQueueBackend.fetched["sms"], 2)
+
+    @override_settings(
+        TASKS={"default": {**FAKE_QUEUE_BACKEND, "QUEUES": ["sms", "broken"]}}
+    )
+    def test_failing_destination_is_reported(self):
+        stats = task_backends["default"].get_queue_stats()
+
+        self.assertEqual(stats[0].error, "builtins.ConnectionError")
+        self.assertIsNone(stats[0].depth)
+        self.assertEqual(stats[1].depth, 1)
+
+    @override_settings(
+        TASKS={
+            "default": FAKE_QUEUE_BACKEND,
+            "sqs": {
+                "BACKEND": "django_tasks_cloud.aws.backends.SQSBackend",
+                "OPTIONS": {"AWS_REGION": "ap-south-1"},
+            },
+        }
+    )
+    def test_view_reports_back_ends_failing_to_build(self):
+        response = self.client.get(reverse("queue-stats"))
+
+        self.assertEqual(response.status_code, 200)
+        queues = response.json()["queues"]
+        self.assertEqual(len(queues), 4)
+        self.assertEqual(
+            queues[-1],
+            {
+                "backend": "sqs",
+                "destination": None,
+                "depth": None,
+                "in_flight": None,
+                "scheduled": None,
+                "oldest_age": None,
+                "error": "django.core.exceptions.ImproperlyConfigured",
+            },
+        )
+
+    def test_view_renders_prometheus(self):
+        response = self.client.get(reverse("queue-stats"), {"format": "prometheus"})
+
+        self.assertIn(
+            'django_tasks_cloud_queue_depth{backend="default",destination="sms"} 1',
+            response.content.decode(),
+        )
+
+
+DUMMY_TASKS = {
+    "default": {
+        "BACKEND": "django.tasks.backends.dummy.DummyBackend",
+        "QUEUES": ["default", "reduce"],
+    }
+}
+
+# Tasks are validated against their back-end when defined
+with override_settings(TASKS=DUMMY_TASKS):
+
+    @task
+    def resize_image(image_id):
+        pass
+
+    @task
+    def build_album(album_id, group_id):
+        pass
+
+
+def _enqueue_failing(names, exception=None):
+    """Make the dummy back-end fail tasks named in `names`."""
+    enqueue = DummyBackend.enqueue
+
+    def fake_enqueue(backend, task, args, kwargs):
+        if task.name not in names:
+            return enqueue(backend, task, args, kwargs)
+        if exception is not None:
+            raise exception
+        result = enqueue(backend, task, args, kwargs)
+        object.__setattr__(result, "status", TaskResultStatus.FAILED)
+        return result
+
+    return mock.patch.object(DummyBackend, "enqueue", fake_enqueue)
+
+
+@override_settings(TASKS=DUMMY_TASKS)
+class TaskGroupTests(TestCase):
+    def setUp(self):
+        task_backends["default"].clear()
+
+    def enqueue(self, size=3):
+        return enqueue_group(
+            [(resize_image, [image_id], {}) for image_id in range(size)],
+            callback=build_album,
+            callback_kwargs={"album_id": 7},
+        )
+
+    def callbacks(self):
+        return [
+            result
+            for result in task_backends["default"].results
+            if result.task.name == "build_album"
+        ]
+
+    def test_callback_is_enqueued_once_every_member_finished(self):
+        group = self.enqueue()
+        members = list(group.results.values_list("pk", flat=True))
+        self.assertEqual(len(members), 3)
+
+        self.assertTrue(record_member_finished(members[0], "SUCCESSFUL"))
+        self.assertFalse(record_member_finished(members[0], "SUCCESSFUL"))
+        self.assertTrue(record_member_finished(members[1], "FAILED"))
+        self.assertEqual(self.callbacks(), [])
+
+        self.assertTrue(record_member_finished(members[2], "SUCCESSFUL"))
+        self.assertIsNone(enqueue_group_callback(group.pk))
+
+        group.refresh_from_db()
+        self.assertEqual((group.finished, group.failed), (3, 1))
+        [callback] = self.callbacks()
+        self.assertEqual(callback.kwargs, {"album_id": 7, "group_id": str(group.pk)})
+        self.assertEqual(group.callback_result_id, callback.id)
+
+    def test_members_reported_before_being_attached_are_counted(self):
+        def finish_right_away(sender, task_result, **kwargs):
+            if task_result.task.name == "resize_image":
+                record_member_finished(task_result.id, "SUCCESSFUL")
+
+        task_enqueued.connect(finish_right_away)
+        self.addCleanup(task_enqueued.disconnect, finish_right_away)
+
+        group = self.enqueue()
+
+        self.assertEqual((group.finished, group.failed), (3, 0))
+        self.assertEqual(group.results.count(), 3)
+        self.assertEqual(len(self.callbacks()), 1)
+
+    def test_members_failing_to_enqueue_count_as_failed(self):
+        for exception in (None, ConnectionError()):
+            with self.subTest(exception=exception):
+                with _enqueue_failing({"resize_image"}, exception):
+                    group = self.enqueue(size=2)
+
+                self.assertEqual((group.finished, group.failed), (2, 2))
+                self.assertIsNotNone(group.callback_enqueued_at)
+
+        self.assertEqual(len(self.callbacks()), 2)
+
+    def test_empty_group_enqueues_its_callback_right_away(self):
+        group = self.enqueue(size=0)
+
+        self.assertTrue(group.is_complete)
+        self.assertEqual(len(self.callbacks()), 1)
+
+    def test_callback_failing_to_enqueue_releases_the_claim(self):
+        with _enqueue_failing({"build_album"}):
+            group = self.enqueue(size=0)
+        self.assertIsNone(group.callback_enqueued_at)
+
+        with _enqueue_failing({"build_album"}, ConnectionError()):
+            with self.assertRaises(ConnectionError):
+                enqueue_group_callback(group.pk)
+        group.refresh_from_db()
+        self.assertIsNone(group.callback_enqueued_at)
+
+        result = enqueue_group_callback(group.pk)
+        group.refresh_from_db()
+        self.assertEqual(group.callback_result_id, result.id)
+        self.assertIsNone(enqueue_group_callback(group.pk))
+
+    def test_callback_keeps_its_queue_priority_and_run_after(self):
+        run_after = timezone.now() + timedelta(hours=1)
+        enqueue_group(
+            [],
+            callback=build_album.using(
+                queue_name="reduce", priority=50, run_after=run_after
+            ),
+            callback_kwargs={"album_id": 7},
+        )
+
+        [callback] = self.callbacks()
+        self.assertEqual(callback.task.queue_name, "reduce")
+        self.assertEqual(callback.task.priority, 50)
+        self.assertEqual(callback.task.run_after, run_after)
+
+    def test_members_are_inserted_in_bulk(self):
+        with CaptureQueriesContext(connection) as small:
+            self.enqueue(size=2)
+        with CaptureQueriesContext(connection) as large:
+            self.enqueue(size=50)
+
+        self.assertEqual(len(large), len(small))
+
+    def test_rejects_unfinished_status(self):
+        with self.assertRaises(ValueError):
+            record_member_finished("result", "RUNNING")
+
+        self.assertFalse(TaskGroup.objects.exists())
@@ -1 +1,7 @@
 from django.urls import path
+
+from django_tasks_cloud.base import views
+
+urlpatterns = [
+    path("queues/stats/", views.queue_stats, name="queue-stats"),
+]
@@ -0,0 +1,72 @@
+from dataclasses import asdict
+
+from django.http import HttpResponse, JsonResponse
+from django.tasks import task_backends
+from django.views.decorators.http import require_GET
+
+from django_tasks_cloud.base.stats import QueueStats
+
+_PROMETHEUS_METRICS = (
+    ("depth", "Approximate number of messages available to consumers."),
+    ("in_flight", "Approximate number of messages received but not yet deleted."),
+    ("scheduled", "Approximate number of delayed or scheduled messages."),
+    ("oldest_age", "Age of the oldest message, in seconds."),
+)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_prometheus(stats: list[QueueStats]) -> str:
+    lines = []
+    for field, description in _PROMETHEUS_METRICS:
+        metric = f"django_tasks_cloud_queue_{field}"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} gauge")
+        for queue_stats in stats:
+            value = getattr(queue_stats, field)
+            if value is None:
+                continue
+            labels = (
+                f'backend="{_escape_label(queue_stats.backend)}",'
+                f'destination="{_escape_label(queue_stats.destination)}"'
+            )
+            lines.append(f"{metric}{{{labels}}} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _collect_stats() -> list[QueueStats]:
+    stats = []
+    for alias in task_backends.settings:
+        # One misconfigured back-end must not hide the statistics of the others
+        try:
+            backend = task_backends[alias]
+        except Exception as exc:
+            stats.append(
+                QueueStats(
+                    alias,
+                    None,
+                    error=f"{exc.__class__.__module__}.{exc.__class__.__qualname__}",
+                )
+            )
+            continue
+
+        if getattr(backend, "supports_queue_stats", False):
+            stats.extend(backend.get_queue_stats())
+
+    return stats
+
+
+@require_GET
+def queue_stats(request):
+    stats = _collect_stats()
+
+    if request.GET.get("format") == "prometheus":
+        return HttpResponse(
+            _render_prometheus(stats),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+    return JsonResponse({"queues": [asdict(queue_stats) for queue_stats in stats]})